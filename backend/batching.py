@@ -0,0 +1,86 @@
+import asyncio
+from typing import Optional
+
+# Micro-batcher that coalesces concurrent work, e.g. database writes
+class BatchScheduler:
+    """Coalesce concurrent submissions and hand each batch to one handler call"""
+
+    def __init__(self, handler, max_batch: int = 8, max_wait_ms: int = 20):
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._consumer: Optional[asyncio.Task] = None
+        self._flushes: set = set()
+        self._closed = False
+
+    def start(self):
+        self._closed = False
+        self._queue = asyncio.Queue()
+        self._consumer = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._closed = True
+        if self._consumer:
+            self._consumer.cancel()
+            await asyncio.gather(self._consumer, return_exceptions=True)
+            self._consumer = None
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+        # Fail anything still queued so its submitter doesn't wait forever
+        if self._queue:
+            while not self._queue.empty():
+                _, future = self._queue.get_nowait()
+                self._fail(future)
+
+    async def submit(self, item):
+        """Queue an item for the next batch and wait for its result"""
+        if self._closed:
+            raise RuntimeError("Batch scheduler stopped")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        batch = []
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                deadline = loop.time() + self.max_wait
+                while len(batch) < self.max_batch:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                # Flush concurrently so a slow batch doesn't hold up the next one
+                flush = asyncio.create_task(self._flush(batch))
+                self._flushes.add(flush)
+                flush.add_done_callback(self._flushes.discard)
+                batch = []
+        except asyncio.CancelledError:
+            # Items taken off the queue but not yet flushed
+            for _, future in batch:
+                self._fail(future)
+            raise
+
+    async def _flush(self, batch):
+        try:
+            results = await self.handler([item for item, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    @staticmethod
+    def _fail(future):
+        if not future.done():
+            future.set_exception(RuntimeError("Batch scheduler stopped"))
@@ -1,26 +1,133 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, BackgroundTasks, HTTPException
 from dotenv import load_dotenv
+from fastapi.responses import ORJSONResponse
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
 import os
+import asyncio
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, TypeAdapter
+from typing import List, Literal, Optional
 import uuid
-from datetime import datetime
+import uuid_utils
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
 from emergentintegrations.llm.chat import LlmChat, UserMessage
+from batching import BatchScheduler
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(
+    mongo_url,
+    maxPoolSize=50,
+    minPoolSize=10,
+    maxIdleTimeMS=300000,
+    serverSelectionTimeoutMS=5000,
+    retryWrites=True,
+    # Return stored timestamps as aware UTC, matching what the models write
+    tz_aware=True,
+    tzinfo=timezone.utc
+)
 db = client[os.environ['DB_NAME']]
 
+# LLM credentials, required at startup
+EMERGENT_LLM_KEY = os.environ['EMERGENT_LLM_KEY']
+
+# Story generation prompt, kept identical across requests so the provider
+# can reuse its cached prefix
+SYSTEM_MESSAGE = """You are a creative storyteller who transforms dreams into vivid, cinematic narratives.
+Your task is to take a dream description and convert it into a well-structured story with:
+1. Clear scene descriptions suitable for video generation
+2. Engaging narrative flow
+3. Rich visual details
+4. Emotional depth
+5. A coherent beginning, middle, and end
+
+Keep the story between 200-500 words and make it suitable for video/audio generation."""
+
+# LlmChat keeps the conversation history of its session, so every
+# generation gets a fresh chat rather than reusing one across dreams
+def create_llm_chat(session_id: str) -> LlmChat:
+    """Build the story generation chat for a single dream"""
+    return LlmChat(
+        api_key=EMERGENT_LLM_KEY,
+        session_id=session_id,
+        system_message=SYSTEM_MESSAGE
+    ).with_model("openai", "gpt-4o-mini")
+
+async def _write_dream_updates(items):
+    """Apply a batch of (dream_id, fields) updates in one round trip"""
+    # Only dreams still "processing" are updated, so one already failed as
+    # stale is never flipped back to completed
+    if len(items) == 1:
+        dream_id, fields = items[0]
+        await db.dream_generations.update_one(
+            {"id": dream_id, "status": "processing"}, {"$set": fields}
+        )
+        return [None]
+    
+    results = [None] * len(items)
+    try:
+        await db.dream_generations.bulk_write(
+            [
+                UpdateOne({"id": dream_id, "status": "processing"}, {"$set": fields})
+                for dream_id, fields in items
+            ],
+            ordered=False
+        )
+    except BulkWriteError as e:
+        # Write concern failures leave every operation's outcome unknown
+        if e.details.get("writeConcernErrors"):
+            raise
+        # The batch is unordered, so only the reported operations failed
+        for write_error in e.details.get("writeErrors", []):
+            results[write_error["index"]] = BulkWriteError(
+                {"writeErrors": [write_error]}
+            )
+    return results
+
+# Prompts go straight to their own LlmChat: each chat is fresh, so batching
+# them would only add wait time. Completion writes are batched instead.
+update_batcher = BatchScheduler(_write_dream_updates, max_batch=64)
+
+# Generation jobs run as in-process background tasks, so a worker that stops
+# after returning 202 leaves its dreams "processing"; treat any that are older
+# than this as failed. LLM calls time out well before that (and before the
+# clients' 120s polling deadline), so a stale dream is never one a live worker
+# is still generating.
+STALE_GENERATION_AGE = timedelta(minutes=10)
+LLM_TIMEOUT_SECONDS = 90
+
+def _stale_cutoff() -> datetime:
+    return datetime.now(timezone.utc) - STALE_GENERATION_AGE
+
+def _stale_query() -> dict:
+    return {"status": "processing", "timestamp": {"$lt": _stale_cutoff()}}
+
+async def _fail_stale_generations():
+    await db.dream_generations.update_many(_stale_query(), {"$set": {"status": "failed"}})
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the connection pool before the first request arrives
+    await client.admin.command("ping")
+    # Index the app-level lookups; the compound index also serves session_id
+    await db.dream_generations.create_index("id", unique=True)
+    await db.dream_generations.create_index([("session_id", 1), ("timestamp", -1)])
+    await _fail_stale_generations()
+    update_batcher.start()
+    yield
+    await update_batcher.stop()
+    client.close()
+
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -28,12 +135,13 @@ api_router = APIRouter(prefix="/api")
 # Models
 class DreamRequest(BaseModel):
     dream_text: str
-    format_type: str = "video"  # "video" or "podcast"
+    format_type: Literal["video", "podcast"] = "video"
     include_audio: bool = True
     session_id: Optional[str] = None
 
 class DreamGeneration(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    # Time-ordered ids keep inserts on the right edge of the id index
+    id: str = Field(default_factory=lambda: str(uuid_utils.uuid7()))
     dream_text: str
     generated_story: str
     format_type: str
@@ -42,16 +150,28 @@ class DreamGeneration(BaseModel):
     video_url: Optional[str] = None
     audio_url: Optional[str] = None
     session_id: str
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class StatusCheck(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     client_name: str
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class StatusCheckCreate(BaseModel):
     client_name: str
 
+# Batch validators for documents read back from MongoDB
+_DREAMS_ADAPTER = TypeAdapter(List[DreamGeneration])
+_STATUS_CHECKS_ADAPTER = TypeAdapter(List[StatusCheck])
+
+# Placeholder (video_url, audio_url) templates by (format_type, include_audio)
+MEDIA_URL_TEMPLATES = {
+    ("video", True): ("https://example.com/video/{}.mp4", "https://example.com/audio/{}.mp3"),
+    ("video", False): ("https://example.com/video/{}.mp4", None),
+    ("podcast", True): (None, "https://example.com/podcast/{}.mp3"),
+    ("podcast", False): (None, "https://example.com/podcast/{}.mp3"),
+}
+
 # Fallback story generation function
 def generate_fallback_story(dream_text: str) -> str:
     """Generate a basic story template when LLM is unavailable"""
@@ -65,84 +185,70 @@ As the dream progresses, each scene builds upon the last, creating a narrative t
 
 The dream concludes with a sense of wonder, leaving the dreamer with lasting impressions that continue to resonate long after awakening. This is the power of dreams - to transport us to realms beyond our everyday experience and reveal truths about ourselves we never knew existed."""
 
-# Dream generation endpoint
-@api_router.post("/generate-dream", response_model=DreamGeneration)
-async def generate_dream_content(request: DreamRequest):
+# Background story generation, run after the request has been accepted
+async def _run_generation(dream_id: str, session_id: str, request: DreamRequest):
     try:
-        # Generate session ID if not provided
-        session_id = request.session_id or str(uuid.uuid4())
-        
-        generated_story = ""
-        
         # Try LLM generation first
-        api_key = os.environ.get('EMERGENT_LLM_KEY')
-        if api_key:
-            try:
-                # Create story generation prompt
-                system_message = """You are a creative storyteller who transforms dreams into vivid, cinematic narratives. 
-                Your task is to take a dream description and convert it into a well-structured story with:
-                1. Clear scene descriptions suitable for video generation
-                2. Engaging narrative flow
-                3. Rich visual details
-                4. Emotional depth
-                5. A coherent beginning, middle, and end
-                
-                Keep the story between 200-500 words and make it suitable for video/audio generation."""
-                
-                chat = LlmChat(
-                    api_key=api_key,
-                    session_id=session_id,
-                    system_message=system_message
-                ).with_model("openai", "gpt-4o-mini")
-                
-                # Generate story from dream
-                user_message = UserMessage(
-                    text=f"Transform this dream into a compelling story: {request.dream_text}"
-                )
-                
-                story_response = await chat.send_message(user_message)
-                generated_story = story_response
-                logging.info("LLM story generation successful")
-                
-            except Exception as llm_error:
-                logging.error(f"LLM generation failed: {str(llm_error)}")
-                # Fallback to template-based story generation
-                generated_story = generate_fallback_story(request.dream_text)
-                logging.info("Using fallback story generation")
-        else:
-            # No API key available, use fallback
+        try:
+            chat = create_llm_chat(session_id)
+            
+            # Generate story from dream
+            user_message = UserMessage(
+                text=f"Transform this dream into a compelling story: {request.dream_text}"
+            )
+            
+            story_response = await asyncio.wait_for(
+                chat.send_message(user_message), timeout=LLM_TIMEOUT_SECONDS
+            )
+            generated_story = story_response
+            logging.info("LLM story generation successful")
+            
+        except Exception as llm_error:
+            logging.error(f"LLM generation failed: {str(llm_error)}")
+            # Fallback to template-based story generation
             generated_story = generate_fallback_story(request.dream_text)
-            logging.info("No LLM API key, using fallback story generation")
-        
-        # Create dream generation record
-        dream_gen = DreamGeneration(
-            dream_text=request.dream_text,
-            generated_story=generated_story,
-            format_type=request.format_type,
-            include_audio=request.include_audio,
-            session_id=session_id,
-            status="story_generated"
-        )
-        
-        # Save to database
-        await db.dream_generations.insert_one(dream_gen.dict())
+            logging.info("Using fallback story generation")
         
         # For now, simulate video/audio generation (placeholder)
         # In production, this would call actual video generation APIs
-        if request.format_type == "video":
-            dream_gen.video_url = f"https://example.com/video/{dream_gen.id}.mp4"
-            if request.include_audio:
-                dream_gen.audio_url = f"https://example.com/audio/{dream_gen.id}.mp3"
-        else:  # podcast
-            dream_gen.audio_url = f"https://example.com/podcast/{dream_gen.id}.mp3"
+        video_url, audio_url = (
+            template.format(dream_id) if template else None
+            for template in MEDIA_URL_TEMPLATES[(request.format_type, request.include_audio)]
+        )
         
-        dream_gen.status = "completed"
+        await update_batcher.submit((dream_id, {
+            "generated_story": generated_story,
+            "status": "completed",
+            "video_url": video_url,
+            "audio_url": audio_url
+        }))
         
-        # Update in database
+    except Exception as e:
+        logging.error(f"Error generating dream content: {str(e)}")
+        # Only fail dreams that haven't already been completed
         await db.dream_generations.update_one(
-            {"id": dream_gen.id},
-            {"$set": dream_gen.dict()}
+            {"id": dream_id, "status": "processing"},
+            {"$set": {"status": "failed"}}
         )
+
+# Dream generation endpoint; the story is generated in the background and
+# clients poll GET /dream/{dream_id} until the status leaves "processing"
+@api_router.post("/generate-dream", response_model=DreamGeneration, status_code=202)
+async def generate_dream_content(request: DreamRequest, background: BackgroundTasks):
+    try:
+        # Generate session ID if not provided
+        session_id = request.session_id or str(uuid.uuid4())
+        
+        dream_gen = DreamGeneration(
+            dream_text=request.dream_text,
+            generated_story="",
+            format_type=request.format_type,
+            include_audio=request.include_audio,
+            session_id=session_id
+        )
+        
+        await db.dream_generations.insert_one(dream_gen.model_dump(mode="python", exclude_none=True))
+        background.add_task(_run_generation, dream_gen.id, session_id, request)
         
         return dream_gen
         
@@ -153,16 +259,30 @@ async def generate_dream_content(request: DreamRequest):
 # Get dream generation by ID
 @api_router.get("/dream/{dream_id}", response_model=DreamGeneration)
 async def get_dream_generation(dream_id: str):
-    dream = await db.dream_generations.find_one({"id": dream_id})
+    dream = await db.dream_generations.find_one({"id": dream_id}, {"_id": 0})
     if not dream:
         raise HTTPException(status_code=404, detail="Dream generation not found")
-    return DreamGeneration(**dream)
+    if dream["status"] == "processing" and dream["timestamp"] < _stale_cutoff():
+        # The job may have finished since the read above, so only fail the
+        # dream if it is still processing and report what is stored afterwards
+        dream = await db.dream_generations.find_one_and_update(
+            {"id": dream_id, **_stale_query()},
+            {"$set": {"status": "failed"}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        ) or await db.dream_generations.find_one({"id": dream_id}, {"_id": 0})
+    return DreamGeneration.model_construct(**dream)
 
 # Get all dreams for a session
 @api_router.get("/dreams/session/{session_id}", response_model=List[DreamGeneration])
 async def get_session_dreams(session_id: str):
-    dreams = await db.dream_generations.find({"session_id": session_id}).to_list(100)
-    return [DreamGeneration(**dream) for dream in dreams]
+    # Collect the whole (bounded) result before responding so cursor errors
+    # still become a 500; small batches let decoding overlap with fetching
+    cursor = db.dream_generations.find(
+        {"session_id": session_id}, {"_id": 0}
+    ).sort("timestamp", -1).limit(100).batch_size(32)
+    dreams = [dream async for dream in cursor]
+    return _DREAMS_ADAPTER.validate_python(dreams)
 
 # Original endpoints
 @api_router.get("/")
@@ -171,23 +291,30 @@ async def root():
 
 @api_router.post("/status", response_model=StatusCheck)
 async def create_status_check(input: StatusCheckCreate):
-    status_dict = input.dict()
-    status_obj = StatusCheck(**status_dict)
-    _ = await db.status_checks.insert_one(status_obj.dict())
+    status_obj = StatusCheck(client_name=input.client_name)
+    _ = await db.status_checks.insert_one(status_obj.model_dump(mode="python", exclude_none=True))
     return status_obj
 
 @api_router.get("/status", response_model=List[StatusCheck])
 async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
+    cursor = db.status_checks.find({}, {"_id": 0}).limit(1000).batch_size(200)
+    status_checks = [status_check async for status_check in cursor]
+    return _STATUS_CHECKS_ADAPTER.validate_python(status_checks)
 
 # Include the router in the main app
 app.include_router(api_router)
 
+# Parse CORS origins once, ignoring blanks and whitespace around entries
+cors_origins = [
+    origin.strip() for origin in os.environ.get('CORS_ORIGINS', '*').split(',') if origin.strip()
+]
+if '*' in cors_origins:
+    cors_origins = ['*']
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+    allow_origins=cors_origins,
     allow_methods=["*"],
     allow_headers=["*"],
 )
@@ -198,7 +325,3 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
@@ -19,16 +19,23 @@ load_dotenv('/app/frontend/.env')
 BACKEND_URL = os.environ.get('REACT_APP_BACKEND_URL', 'https://dreamteller-2.preview.emergentagent.com')
 API_BASE = f"{BACKEND_URL}/api"
 
+# Fields every dream generation response must include
+REQUIRED_DREAM_FIELDS = frozenset({
+    'id', 'dream_text', 'generated_story', 'format_type', 'include_audio', 'status', 'session_id'
+})
+
 class DreamTellerAPITest:
     def __init__(self):
         self.session = None
         self.test_results = []
         self.generated_dream_ids = []
+        self.dream_ids_lock = asyncio.Lock()
         self.test_session_id = str(uuid.uuid4())
         
     async def setup(self):
-        """Initialize HTTP session"""
-        self.session = aiohttp.ClientSession()
+        """Initialize HTTP session shared by all tests"""
+        connector = aiohttp.TCPConnector(limit=100, keepalive_timeout=75)
+        self.session = aiohttp.ClientSession(connector=connector)
         
     async def cleanup(self):
         """Clean up HTTP session"""
@@ -50,6 +57,20 @@ class DreamTellerAPITest:
         if response_data and not success:
             print(f"   Response: {json.dumps(response_data, indent=2)}")
             
+    async def wait_for_dream(self, dream_id, timeout=120, interval=1.0):
+        """Poll a dream generation until it leaves the processing state"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while loop.time() < deadline:
+            async with self.session.get(f"{API_BASE}/dream/{dream_id}") as response:
+                if response.status != 200:
+                    return None
+                data = await response.json()
+                if data.get('status') != 'processing':
+                    return data
+            await asyncio.sleep(interval)
+        return None
+            
     async def test_api_root(self):
         """Test API root endpoint"""
         try:
@@ -76,15 +97,20 @@ class DreamTellerAPITest:
         
         try:
             async with self.session.post(f"{API_BASE}/generate-dream", json=dream_data) as response:
-                if response.status == 200:
+                if response.status == 202:
                     data = await response.json()
                     
                     # Validate response structure
-                    required_fields = ['id', 'dream_text', 'generated_story', 'format_type', 'include_audio', 'status', 'session_id']
-                    missing_fields = [field for field in required_fields if field not in data]
+                    missing_fields = REQUIRED_DREAM_FIELDS - data.keys()
                     
                     if missing_fields:
-                        self.log_result("Dream Generation (Video)", False, f"Missing fields: {missing_fields}", data)
+                        self.log_result("Dream Generation (Video)", False, f"Missing fields: {sorted(missing_fields)}", data)
+                        return
+                        
+                    # Wait for the background generation to finish
+                    data = await self.wait_for_dream(data['id'])
+                    if not data or data['status'] != 'completed':
+                        self.log_result("Dream Generation (Video)", False, "Generation did not complete", data)
                         return
                         
                     # Validate content
@@ -105,7 +131,8 @@ class DreamTellerAPITest:
                         return
                         
                     # Store dream ID for later tests
-                    self.generated_dream_ids.append(data['id'])
+                    async with self.dream_ids_lock:
+                        self.generated_dream_ids.append(data['id'])
                     
                     self.log_result("Dream Generation (Video)", True, 
                                   f"Successfully generated story ({len(data['generated_story'])} chars), ID: {data['id']}")
@@ -127,9 +154,15 @@ class DreamTellerAPITest:
         
         try:
             async with self.session.post(f"{API_BASE}/generate-dream", json=dream_data) as response:
-                if response.status == 200:
+                if response.status == 202:
                     data = await response.json()
                     
+                    # Wait for the background generation to finish
+                    data = await self.wait_for_dream(data['id'])
+                    if not data or data['status'] != 'completed':
+                        self.log_result("Dream Generation (Podcast)", False, "Generation did not complete", data)
+                        return
+                        
                     if data['format_type'] != 'podcast':
                         self.log_result("Dream Generation (Podcast)", False, "Format type should be podcast", data)
                         return
@@ -139,7 +172,8 @@ class DreamTellerAPITest:
                         return
                         
                     # Store dream ID for later tests
-                    self.generated_dream_ids.append(data['id'])
+                    async with self.dream_ids_lock:
+                        self.generated_dream_ids.append(data['id'])
                     
                     self.log_result("Dream Generation (Podcast)", True, 
                                   f"Successfully generated podcast story, ID: {data['id']}")
@@ -247,7 +281,7 @@ class DreamTellerAPITest:
         try:
             async with self.session.post(f"{API_BASE}/generate-dream", json=dream_data) as response:
                 # Should either validate and reject, or accept and handle gracefully
-                if response.status in [200, 422, 500]:
+                if response.status in [202, 422, 500]:
                     self.log_result("Error Handling (Invalid Format)", True, 
                                   f"Handled invalid format appropriately (status: {response.status})")
                 else:
@@ -275,7 +309,7 @@ class DreamTellerAPITest:
             self.log_result("Error Handling (Nonexistent Dream)", False, f"Request error: {str(e)}")
             
     async def run_all_tests(self):
-        """Run all tests in sequence"""
+        """Run all tests, concurrently where they don't depend on each other"""
         print(f"🚀 Starting Dream Teller Backend API Tests")
         print(f"📍 Testing against: {API_BASE}")
         print(f"🔑 Session ID: {self.test_session_id}")
@@ -284,18 +318,21 @@ class DreamTellerAPITest:
         await self.setup()
         
         try:
-            # Core functionality tests
-            await self.test_api_root()
-            await self.test_dream_generation_video()
-            await self.test_dream_generation_podcast()
+            # Independent checks
+            await asyncio.gather(
+                self.test_api_root(),
+                self.test_error_handling_empty_dream(),
+                self.test_error_handling_invalid_format(),
+                self.test_nonexistent_dream_retrieval()
+            )
+            
+            # Core functionality tests; retrieval depends on the generated dreams
+            video_task = asyncio.create_task(self.test_dream_generation_video())
+            podcast_task = asyncio.create_task(self.test_dream_generation_podcast())
+            await asyncio.gather(video_task, podcast_task)
             await self.test_dream_retrieval()
             await self.test_session_dreams_retrieval()
             
-            # Error handling tests
-            await self.test_error_handling_empty_dream()
-            await self.test_error_handling_invalid_format()
-            await self.test_nonexistent_dream_retrieval()
-            
         finally:
             await self.cleanup()
             
@@ -4,6 +4,9 @@ import axios from "axios";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+const POLL_INTERVAL_MS = 1000;
+const POLL_TIMEOUT_MS = 120000;
+const POLL_TIMEOUT_ERROR = "Dream generation timed out";
 
 function App() {
   const [dreamText, setDreamText] = useState("");
@@ -25,10 +28,27 @@ function App() {
         session_id: sessionId
       });
       
-      setGeneratedContent(response.data);
+      // Generation runs in the background; poll until it finishes
+      let dream = response.data;
+      const deadline = Date.now() + POLL_TIMEOUT_MS;
+      while (dream.status === "processing") {
+        if (Date.now() > deadline) {
+          throw new Error(POLL_TIMEOUT_ERROR);
+        }
+        await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL_MS));
+        const poll = await axios.get(`${API}/dream/${dream.id}`);
+        dream = poll.data;
+      }
+      if (dream.status === "failed") {
+        throw new Error("Dream generation failed");
+      }
+      
+      setGeneratedContent(dream);
     } catch (error) {
       console.error("Error generating dream content:", error);
-      alert("Failed to generate content. Please try again.");
+      alert(error.message === POLL_TIMEOUT_ERROR
+        ? "Your dream is taking too long to generate. Please try again later."
+        : "Failed to generate content. Please try again.");
     } finally {
       setIsGenerating(false);
     }
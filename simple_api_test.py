@@ -11,35 +11,59 @@ from dotenv import load_dotenv
 load_dotenv('/app/frontend/.env')
 BACKEND_URL = os.environ.get('REACT_APP_BACKEND_URL', 'https://dreamteller-2.preview.emergentagent.com')
 API_BASE = f"{BACKEND_URL}/api"
+POLL_TIMEOUT = 120  # seconds to wait for a background generation
 
-async def test_simple_dream():
-    async with aiohttp.ClientSession() as session:
-        dream_data = {
-            "dream_text": "I was flying",
-            "format_type": "video",
-            "include_audio": True
-        }
-        
-        print("Testing simple dream generation...")
-        
-        try:
-            async with session.post(f"{API_BASE}/generate-dream", json=dream_data) as response:
-                print(f"Status: {response.status}")
+def create_session():
+    """Create a long-lived HTTP session with keep-alive connection pooling"""
+    connector = aiohttp.TCPConnector(limit=100, keepalive_timeout=75)
+    return aiohttp.ClientSession(connector=connector)
+
+async def test_simple_dream(session):
+    dream_data = {
+        "dream_text": "I was flying",
+        "format_type": "video",
+        "include_audio": True
+    }
+    
+    print("Testing simple dream generation...")
+    
+    try:
+        async with session.post(f"{API_BASE}/generate-dream", json=dream_data) as response:
+            print(f"Status: {response.status}")
+            
+            if response.status == 202:
+                data = await response.json()
+                
+                # Generation runs in the background; poll until it finishes
+                deadline = asyncio.get_running_loop().time() + POLL_TIMEOUT
+                while data.get('status') == 'processing':
+                    if asyncio.get_running_loop().time() > deadline:
+                        print(f"❌ Generation timed out after {POLL_TIMEOUT}s")
+                        return False
+                    await asyncio.sleep(1)
+                    async with session.get(f"{API_BASE}/dream/{data['id']}") as poll:
+                        data = await poll.json()
                 
-                if response.status == 200:
-                    data = await response.json()
-                    print(f"✅ Success! Generated story length: {len(data.get('generated_story', ''))}")
-                    print(f"Story preview: {data.get('generated_story', '')[:100]}...")
-                    return True
-                else:
-                    error_text = await response.text()
-                    print(f"❌ Error: {error_text}")
+                if data.get('status') != 'completed':
+                    print(f"❌ Generation {data.get('status')}")
                     return False
-                    
-        except Exception as e:
-            print(f"❌ Exception: {str(e)}")
-            return False
+                
+                print(f"✅ Success! Generated story length: {len(data.get('generated_story', ''))}")
+                print(f"Story preview: {data.get('generated_story', '')[:100]}...")
+                return True
+            else:
+                error_text = await response.text()
+                print(f"❌ Error: {error_text}")
+                return False
+                
+    except Exception as e:
+        print(f"❌ Exception: {str(e)}")
+        return False
+
+async def main():
+    async with create_session() as session:
+        return await test_simple_dream(session)
 
 if __name__ == "__main__":
-    success = asyncio.run(test_simple_dream())
+    success = asyncio.run(main())
     exit(0 if success else 1)
\ No newline at end of file
@@ -29,15 +29,15 @@ async def test_backend_context():
     
     try:
         # Use same system message as server.py
-        system_message = """You are a creative storyteller who transforms dreams into vivid, cinematic narratives. 
-        Your task is to take a dream description and convert it into a well-structured story with:
-        1. Clear scene descriptions suitable for video generation
-        2. Engaging narrative flow
-        3. Rich visual details
-        4. Emotional depth
-        5. A coherent beginning, middle, and end
-        
-        Keep the story between 200-500 words and make it suitable for video/audio generation."""
+        system_message = """You are a creative storyteller who transforms dreams into vivid, cinematic narratives.
+Your task is to take a dream description and convert it into a well-structured story with:
+1. Clear scene descriptions suitable for video generation
+2. Engaging narrative flow
+3. Rich visual details
+4. Emotional depth
+5. A coherent beginning, middle, and end
+
+Keep the story between 200-500 words and make it suitable for video/audio generation."""
         
         chat = LlmChat(
             api_key=api_key,
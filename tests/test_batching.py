@@ -0,0 +1,159 @@
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from batching import BatchScheduler
+
+
+class FakeHandler:
+    """Records each batch it receives and doubles every item"""
+
+    def __init__(self, delay=0.0):
+        self.batches = []
+        self.delay = delay
+
+    async def __call__(self, items):
+        self.batches.append(list(items))
+        await asyncio.sleep(self.delay)
+        return [item * 2 for item in items]
+
+
+def test_flushes_when_batch_is_full():
+    async def scenario():
+        handler = FakeHandler()
+        scheduler = BatchScheduler(handler, max_batch=3, max_wait_ms=1000)
+        scheduler.start()
+        results = await asyncio.wait_for(
+            asyncio.gather(*[scheduler.submit(i) for i in range(6)]), timeout=0.5
+        )
+        await scheduler.stop()
+        return handler, results
+
+    handler, results = asyncio.run(scenario())
+    assert results == [0, 2, 4, 6, 8, 10]
+    assert handler.batches == [[0, 1, 2], [3, 4, 5]]
+
+
+def test_flushes_partial_batch_after_deadline():
+    async def scenario():
+        handler = FakeHandler()
+        scheduler = BatchScheduler(handler, max_batch=8, max_wait_ms=10)
+        scheduler.start()
+        results = await asyncio.gather(scheduler.submit(1), scheduler.submit(2))
+        await scheduler.stop()
+        return handler, results
+
+    handler, results = asyncio.run(scenario())
+    assert results == [2, 4]
+    assert handler.batches == [[1, 2]]
+
+
+def test_per_item_exceptions_reach_only_their_submitter():
+    async def handler(items):
+        return [ValueError(item) if item == "bad" else item.upper() for item in items]
+
+    async def scenario():
+        scheduler = BatchScheduler(handler, max_batch=3, max_wait_ms=10)
+        scheduler.start()
+        results = await asyncio.gather(
+            *[scheduler.submit(item) for item in ["a", "bad", "c"]],
+            return_exceptions=True
+        )
+        await scheduler.stop()
+        return results
+
+    first, bad, last = asyncio.run(scenario())
+    assert (first, last) == ("A", "C")
+    assert isinstance(bad, ValueError)
+
+
+def test_handler_exception_fans_out_to_whole_batch():
+    async def handler(items):
+        raise RuntimeError("backend down")
+
+    async def scenario():
+        scheduler = BatchScheduler(handler, max_batch=2, max_wait_ms=10)
+        scheduler.start()
+        results = await asyncio.gather(
+            scheduler.submit(1), scheduler.submit(2), return_exceptions=True
+        )
+        await scheduler.stop()
+        return results
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_stop_waits_for_in_flight_flushes():
+    async def scenario():
+        handler = FakeHandler(delay=0.05)
+        scheduler = BatchScheduler(handler, max_batch=1, max_wait_ms=10)
+        scheduler.start()
+        pending = asyncio.ensure_future(scheduler.submit(21))
+        await asyncio.sleep(0.01)
+        await scheduler.stop()
+        return pending
+
+    pending = asyncio.run(scenario())
+    assert pending.result() == 42
+
+
+def test_stop_fails_batch_being_collected():
+    async def scenario():
+        handler = FakeHandler()
+        scheduler = BatchScheduler(handler, max_batch=8, max_wait_ms=10000)
+        scheduler.start()
+        # Picked up by the consumer while it waits for a full batch
+        waiting = [asyncio.ensure_future(scheduler.submit(i)) for i in range(2)]
+        await asyncio.sleep(0.01)
+        await scheduler.stop()
+        results = await asyncio.wait_for(
+            asyncio.gather(*waiting, return_exceptions=True), timeout=0.5
+        )
+        return handler, results
+
+    handler, results = asyncio.run(scenario())
+    assert handler.batches == []
+    assert len(results) == 2
+    for result in results:
+        assert isinstance(result, RuntimeError)
+        assert "stopped" in str(result)
+
+
+def test_stop_fails_items_still_in_the_queue():
+    async def scenario():
+        handler = FakeHandler()
+        scheduler = BatchScheduler(handler, max_batch=8, max_wait_ms=10)
+        scheduler.start()
+        # Queued, but stopped before the consumer gets to take them
+        queued = [asyncio.ensure_future(scheduler.submit(i)) for i in range(2)]
+        await asyncio.sleep(0)
+        await scheduler.stop()
+        results = await asyncio.wait_for(
+            asyncio.gather(*queued, return_exceptions=True), timeout=0.5
+        )
+        return handler, results
+
+    handler, results = asyncio.run(scenario())
+    assert handler.batches == []
+    assert len(results) == 2
+    for result in results:
+        assert isinstance(result, RuntimeError)
+        assert "stopped" in str(result)
+
+
+def test_submit_after_stop_raises():
+    async def scenario():
+        scheduler = BatchScheduler(FakeHandler())
+        scheduler.start()
+        await scheduler.stop()
+        try:
+            await asyncio.wait_for(scheduler.submit(2), timeout=0.5)
+        except RuntimeError as e:
+            return e
+
+    error = asyncio.run(scenario())
+    assert isinstance(error, RuntimeError)
+    assert "stopped" in str(error)